@@ -2,12 +2,18 @@ from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from typing import Optional, Literal
+from pathlib import Path
+import numpy as np
 import pandas as pd
-import uuid
+import pyarrow as pa
+import pyarrow.compute as pc
+import openpyxl
+import asyncio
+import hashlib
+import zipfile
+import secrets
 import os
 
-print("🧨 main.py loaded")
-
 app = FastAPI()
 
 # -------------------------
@@ -35,8 +41,23 @@ app.add_middleware(
 async def preflight(path: str, request: Request):
     return JSONResponse(content={"ok": True})
 
-TMP_DIR = "tmp"
-os.makedirs(TMP_DIR, exist_ok=True)
+TMP_DIR = Path("tmp")
+TMP_DIR.mkdir(exist_ok=True)
+
+# Results are cached on disk by upload content + params; keep at most this many
+RESULT_CACHE_MAX_FILES = 64
+
+# Rows boxed to Python objects per step when writing xlsx
+WRITE_CHUNK_ROWS = 10_000
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+OUTPUT_MEDIA_TYPES = {
+    ".xlsx": XLSX_MEDIA_TYPE,
+    ".csv": "text/csv",
+    ".parquet": "application/vnd.apache.parquet",
+    ".zip": "application/zip",
+}
 
 
 @app.get("/")
@@ -47,22 +68,187 @@ def health_check():
 # =========================
 # File reading helpers
 # =========================
-def read_table(upload: UploadFile) -> pd.DataFrame:
+def save_upload(upload: UploadFile) -> tuple[str, str]:
     """
-    Read either Excel (.xlsx/.xls) or CSV.
+    Copy an upload into TMP_DIR in chunks, hashing the bytes on the way.
+
+    Returns (path, content digest). The path keeps the upload's extension,
+    which read_table uses to pick the parser.
     """
     filename = (upload.filename or "").lower()
+    path = str(TMP_DIR / f"upload_{secrets.token_hex(8)}{os.path.splitext(filename)[1]}")
+    digest = hashlib.blake2b(digest_size=16)
+
+    try:
+        with open(path, "wb") as f:
+            while chunk := upload.file.read(1 << 20):
+                digest.update(chunk)
+                f.write(chunk)
+    except Exception:
+        safe_delete(path)
+        raise
 
-    if filename.endswith(".csv"):
-        return pd.read_csv(upload.file)
+    return path, digest.hexdigest()
+
+
+def _arrow_csv_changed_values(df: pd.DataFrame) -> bool:
+    """
+    True if the Arrow CSV parser typed a column in a way that alters its values
+    compared to the C parser, so the file has to be re-read with the latter.
+    """
+    for _, col in df.items():
+        # integers past int64 (long IDs) come back as float64 and lose digits;
+        # the C parser keeps them exact. Floats this large from e.g. "1e20" parse
+        # the same in both, so falling back for those only costs time.
+        if col.dtype == np.float64 and (np.abs(col.to_numpy()) >= 2**63).any():
+            return True
+
+        # text that isn't valid UTF-8 comes back as raw bytes instead of failing;
+        # the C parser raises a decode error, which the endpoints report as a 400
+        if col.dtype == object and "bytes" in pd.api.types.infer_dtype(col, skipna=True):
+            return True
+
+        # ISO date/time text is inferred as date32/time/timestamp values, which
+        # merges spellings like "2024-01-15" and "2024-01-15 00:00" into one key;
+        # the C parser keeps CSV text as text
+        if pd.api.types.is_datetime64_any_dtype(col.dtype):
+            return True
+        if col.dtype == object and pd.api.types.infer_dtype(col, skipna=True) in ("date", "time", "datetime"):
+            return True
+
+    return False
+
+
+def read_table(path: str) -> pd.DataFrame:
+    """
+    Read either Excel (.xlsx/.xls) or CSV.
+    """
+    if path.endswith(".csv"):
+        # multithreaded Arrow tokenizer; dtypes stay numpy-backed like the default parser
+        try:
+            df = pd.read_csv(path, engine="pyarrow")
+        except Exception:
+            df = None
+
+        # The Arrow parser rejects ragged rows and keeps duplicate headers as-is;
+        # the C parser pads the former with NaN and renames the latter to a/a.1,
+        # so hand those files to it instead
+        if df is None or not df.columns.is_unique or _arrow_csv_changed_values(df):
+            df = pd.read_csv(path)
+
+        return df
 
     # Default to Excel
-    return pd.read_excel(upload.file)
+    return pd.read_excel(path, engine="calamine")
+
+
+# =========================
+# File writing helpers
+# =========================
+OutputFormat = Literal["xlsx", "csv", "parquet"]
+
+
+def output_extension(output_format: OutputFormat, n_sheets: int) -> str:
+    """
+    File extension of a result: xlsx holds every sheet, csv/parquet need a zip for more than one.
+    """
+    if output_format == "xlsx" or n_sheets == 1:
+        return f".{output_format}"
+    return ".zip"
+
+
+def write_output(output_path: str, sheets: dict[str, pd.DataFrame], output_format: OutputFormat):
+    """
+    Write result sheets in the requested format.
+    """
+    # save under a private name first so a concurrent request never serves a half-written cached file
+    part_path = f"{output_path}.{secrets.token_hex(8)}.part"
+
+    try:
+        if output_format == "xlsx":
+            write_workbook(part_path, sheets)
+        elif len(sheets) == 1:
+            _write_flat_file(next(iter(sheets.values())), part_path, output_format)
+        else:
+            # parquet is already compressed; only deflate csv members
+            compression = zipfile.ZIP_DEFLATED if output_format == "csv" else zipfile.ZIP_STORED
+            with zipfile.ZipFile(part_path, "w", compression=compression) as zf:
+                for sheet_name, df in sheets.items():
+                    with zf.open(f"{sheet_name}.{output_format}", "w") as f:
+                        _write_flat_file(df, f, output_format)
+    except Exception:
+        # eviction skips .part files, so nothing else would remove it
+        safe_delete(part_path)
+        raise
+
+    os.replace(part_path, output_path)
+
+
+def _write_flat_file(df: pd.DataFrame, target, output_format: OutputFormat):
+    if output_format == "csv":
+        df.to_csv(target, index=False)
+        return
+
+    # Spreadsheet columns often mix numbers and text; Parquet needs one type per column.
+    # Columns are replaced by position: /process keeps non-string (e.g. numeric) headers
+    mixed = {}
+    for i in np.flatnonzero((df.dtypes == "object").to_numpy()):
+        col = df.iloc[:, i]
+        try:
+            pa.array(col, from_pandas=True)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            mixed[i] = col.astype(str).where(col.notna(), None)
+
+    if mixed:
+        df = df.copy(deep=False)
+        for i, col in mixed.items():
+            df.isetitem(i, col)
+
+    df.to_parquet(target, index=False, compression="zstd")
+
+
+def write_workbook(output_path: str, sheets: dict[str, pd.DataFrame]):
+    """
+    Stream DataFrames into an .xlsx file, one sheet per entry.
+
+    Uses openpyxl's write-only workbook so rows are serialized as they are
+    appended instead of being held in memory as Cell objects.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+
+    for sheet_name, df in sheets.items():
+        ws = wb.create_sheet(sheet_name)
+        ws.append(list(df.columns))
+
+        # Box numpy scalars to Python values and turn NaN/NaT/NA into empty cells,
+        # a block of rows at a time so the boxed copy never spans the whole frame
+        for start in range(0, len(df), WRITE_CHUNK_ROWS):
+            chunk = df.iloc[start:start + WRITE_CHUNK_ROWS]
+            values = chunk.astype(object).where(chunk.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                ws.append(row)
+
+    wb.save(output_path)
+
+
+def _to_arrow_strings(s: pd.Series) -> pa.Array:
+    """
+    Convert a series to an Arrow string array, with missing values as "".
+    """
+    try:
+        # pure-string columns convert directly, no per-element str() calls
+        arr = pa.array(s, type=pa.string(), from_pandas=True)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # numbers, dates, mixed objects: keep Python's str() formatting
+        # (fillna("") is a no-op on datetime columns, so NaT still arrives as null)
+        arr = pa.array(s.fillna("").astype(str), type=pa.string(), from_pandas=True)
+
+    return pc.fill_null(arr, "")
 
 
 def normalize_key(series: pd.Series) -> pd.Series:
     # Normalize to string, strip whitespace, and treat NaN as empty
-    return series.fillna("").astype(str).str.strip()
+    return pc.utf8_trim_whitespace(_to_arrow_strings(series)).to_pandas().set_axis(series.index)
 
 
 # =========================
@@ -72,9 +258,23 @@ def reconcile_files(df_a: pd.DataFrame, df_b: pd.DataFrame, key: str):
     df_a[key] = normalize_key(df_a[key])
     df_b[key] = normalize_key(df_b[key])
 
-    matches = df_a.merge(df_b, on=key, how="inner", suffixes=("_A", "_B"))
-    only_a = df_a[~df_a[key].isin(df_b[key])]
-    only_b = df_b[~df_b[key].isin(df_a[key])]
+    # factorize both key columns together once; membership is then a lookup on the codes.
+    # use_na_sentinel=False: a missing key gets a real group instead of -1, which bincount rejects
+    codes, uniques = pd.factorize(
+        pd.concat([df_a[key], df_b[key]], ignore_index=True), sort=False, use_na_sentinel=False
+    )
+    codes_a, codes_b = codes[: len(df_a)], codes[len(df_a):]
+    in_a = np.bincount(codes_a, minlength=len(uniques)) > 0
+    in_b = np.bincount(codes_b, minlength=len(uniques)) > 0
+
+    # join on the integer codes rather than re-hashing the key strings;
+    # B's key column is dropped so the layout matches a merge on `key`
+    code_col = "__key_code__"
+    left = df_a.assign(**{code_col: codes_a})
+    right = df_b.drop(columns=key).assign(**{code_col: codes_b})
+    matches = left.merge(right, on=code_col, how="inner", suffixes=("_A", "_B")).drop(columns=code_col)
+    only_a = df_a[~in_b[codes_a]]
+    only_b = df_b[~in_a[codes_b]]
 
     summary = pd.DataFrame(
         {
@@ -94,47 +294,116 @@ def safe_delete(path: str):
         pass
 
 
+# =========================
+# Result cache
+# =========================
+def result_cache_path(prefix: str, ext: str, *parts: str) -> str:
+    """
+    Deterministic output path for a set of upload digests + request params.
+    """
+    key = hashlib.blake2b("\u001f".join(parts).encode(), digest_size=16).hexdigest()
+    return str(TMP_DIR / f"{prefix}_{key}{ext}")
+
+
+def touch_cached_result(path: str) -> bool:
+    """
+    Mark a cached result as recently used. Returns False if there is none.
+    """
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+def evict_cached_results(max_files: int = RESULT_CACHE_MAX_FILES):
+    """
+    Delete all but the most recently used result files in TMP_DIR.
+    """
+    try:
+        results = [
+            entry for entry in os.scandir(TMP_DIR)
+            if entry.name.startswith(("result_", "dedupe_")) and not entry.name.endswith(".part")
+        ]
+        results.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    except OSError:
+        return
+
+    for entry in results[max_files:]:
+        safe_delete(entry.path)
+
+
 @app.post("/process")
 async def process_files(
     background_tasks: BackgroundTasks,
     file_a: UploadFile = File(...),
     file_b: UploadFile = File(...),
     match_column: str = Form(...),
+    output_format: OutputFormat = Form("xlsx"),
 ):
+    spooled: list[str] = []
     try:
-        df_a = read_table(file_a)
-        df_b = read_table(file_b)
-    except Exception:
-        return JSONResponse(status_code=400, content={"error": "Invalid file. Upload .xlsx or .csv"})
-
-    if match_column not in df_a.columns or match_column not in df_b.columns:
-        return JSONResponse(
-            status_code=400,
-            content={
-                "error": f"Column '{match_column}' must exist in both files.",
-                "columns_in_a": list(map(str, df_a.columns)),
-                "columns_in_b": list(map(str, df_b.columns)),
-            },
+        try:
+            path_a, digest_a = await asyncio.to_thread(save_upload, file_a)
+            spooled.append(path_a)
+            path_b, digest_b = await asyncio.to_thread(save_upload, file_b)
+            spooled.append(path_b)
+        except Exception:
+            return JSONResponse(status_code=400, content={"error": "Invalid file. Upload .xlsx or .csv"})
+
+        ext = output_extension(output_format, n_sheets=4)
+        output_path = result_cache_path(
+            "result", ext,
+            digest_a, os.path.splitext(path_a)[1],
+            digest_b, os.path.splitext(path_b)[1],
+            match_column, output_format,
         )
+        if touch_cached_result(output_path):
+            return FileResponse(output_path, media_type=OUTPUT_MEDIA_TYPES[ext], filename=f"FixMySheet_Result{ext}")
+
+        try:
+            # pandas/openpyxl work is blocking: run it off the event loop
+            df_a, df_b = await asyncio.gather(
+                asyncio.to_thread(read_table, path_a),
+                asyncio.to_thread(read_table, path_b),
+            )
+        except Exception:
+            return JSONResponse(status_code=400, content={"error": "Invalid file. Upload .xlsx or .csv"})
 
-    matches, only_a, only_b, summary = reconcile_files(df_a, df_b, match_column)
+        if match_column not in df_a.columns or match_column not in df_b.columns:
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "error": f"Column '{match_column}' must exist in both files.",
+                    "columns_in_a": list(map(str, df_a.columns)),
+                    "columns_in_b": list(map(str, df_b.columns)),
+                },
+            )
 
-    file_id = str(uuid.uuid4())
-    output_path = os.path.join(TMP_DIR, f"result_{file_id}.xlsx")
+        matches, only_a, only_b, summary = await asyncio.to_thread(reconcile_files, df_a, df_b, match_column)
 
-    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-        matches.to_excel(writer, sheet_name="Matches", index=False)
-        only_a.to_excel(writer, sheet_name="Only_in_File_A", index=False)
-        only_b.to_excel(writer, sheet_name="Only_in_File_B", index=False)
-        summary.to_excel(writer, sheet_name="Summary", index=False)
+        await asyncio.to_thread(
+            write_output,
+            output_path,
+            {
+                "Matches": matches,
+                "Only_in_File_A": only_a,
+                "Only_in_File_B": only_b,
+                "Summary": summary,
+            },
+            output_format,
+        )
 
-    background_tasks.add_task(safe_delete, output_path)
+        background_tasks.add_task(evict_cached_results)
 
-    return FileResponse(
-        output_path,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename="FixMySheet_Result.xlsx",
-    )
+        return FileResponse(
+            output_path,
+            media_type=OUTPUT_MEDIA_TYPES[ext],
+            filename=f"FixMySheet_Result{ext}",
+        )
+    finally:
+        for spooled_path in spooled:
+            safe_delete(spooled_path)
 
 
 # =========================
@@ -143,6 +412,12 @@ async def process_files(
 KeepPolicy = Literal["mark_all", "keep_first", "keep_last"]
 DedupeMode = Literal["column", "row"]
 
+# RE2 syntax (pyarrow.compute); \s alone is ASCII-only there, \p{Z} adds NBSP and other Unicode spaces
+_WHITESPACE_RE = r"[\s\p{Z}]+"
+
+# Low-cardinality annotation columns are stored as categoricals (compact codes instead of per-row strings)
+_FLAG_DTYPE = pd.CategoricalDtype(["Unique", "Kept", "Duplicate"])
+
 
 def _normalize_text_series(
     s: pd.Series,
@@ -152,19 +427,19 @@ def _normalize_text_series(
     """
     Normalize a text-like series for stable equality comparisons.
     """
-    s = s.fillna("").astype(str)
+    arr = _to_arrow_strings(s)
 
     # strip edges always
-    s = s.str.strip()
+    arr = pc.utf8_trim_whitespace(arr)
 
-    if ignore_whitespace:
-        # remove ALL whitespace (spaces, tabs, newlines)
-        s = s.str.replace(r"\s+", "", regex=True)
+    # remove ALL whitespace (spaces, tabs, newlines); skip the rewrite when none is left after strip
+    if ignore_whitespace and pc.any(pc.match_substring_regex(arr, _WHITESPACE_RE)).as_py():
+        arr = pc.replace_substring_regex(arr, _WHITESPACE_RE, "")
 
     if ignore_case:
-        s = s.str.lower()
+        arr = pc.utf8_lower(arr)
 
-    return s
+    return arr.to_pandas().set_axis(s.index)
 
 
 def _make_row_keys(
@@ -175,19 +450,21 @@ def _make_row_keys(
 ) -> pd.Series:
     """
     Build a stable per-row comparison key from selected columns.
+
+    The key is a 64-bit hash of the normalized row values (uint64 series),
+    so no per-row key strings are materialized.
     """
-    work = df[subset_cols].copy()
+    cols: list[pd.Series] = []
 
     for c in subset_cols:
-        if work[c].dtype == "object":
-            work[c] = _normalize_text_series(work[c], ignore_case, ignore_whitespace)
-        else:
-            work[c] = work[c].where(work[c].notna(), "")
+        col = df[c]
+        if col.dtype == "object" or isinstance(col.dtype, pd.StringDtype):
+            col = _normalize_text_series(col, ignore_case, ignore_whitespace)
 
-        work[c] = work[c].astype(str)
+        cols.append(col)
 
-    delim = "\u001f"  # Unit Separator
-    return work.agg(lambda r: delim.join(r.values.tolist()), axis=1)
+    work = pd.concat(cols, axis=1, ignore_index=True)
+    return pd.util.hash_pandas_object(work, index=False)
 
 
 def _audit_duplicate_groups(
@@ -197,6 +474,7 @@ def _audit_duplicate_groups(
     display_key: Optional[pd.Series],
     keep_policy: KeepPolicy,
     treat_blank_as_unique: bool = True,
+    hashed_key: bool = False,
 ) -> pd.DataFrame:
     """
     Compute audit-friendly duplicate annotations.
@@ -207,62 +485,85 @@ def _audit_duplicate_groups(
       - DuplicateFirstSeenRow
       - DuplicateRankInGroup
       - DuplicateFlag
-      - DuplicateKey (DISPLAY key)
-    """
-    out = df.copy()
-    out_index = out.index
+      - DuplicateKey (DISPLAY key; blank when display_key is None)
 
-    internal_key = group_key.fillna("").astype(str)
+    hashed_key=True means group_key holds row hashes from _make_row_keys,
+    which are grouped as-is (never blank).
+    """
+    out_index = df.index
 
-    if display_key is None:
-        display_key = group_key.fillna("").astype(str)
+    if hashed_key:
+        internal_key = group_key
     else:
-        display_key = display_key.fillna("").astype(str)
+        internal_key = group_key.fillna("").astype(str)
 
     is_blank = internal_key.eq("")
 
     if treat_blank_as_unique:
         internal_key = internal_key.where(~is_blank, other="__BLANK__ROW__" + out_index.astype(str))
 
-    counts = internal_key.map(internal_key.value_counts())
-    in_dup_group = counts.gt(1)
-
-    row_number = pd.Series(range(1, len(out) + 1), index=out_index)
-    first_seen = row_number.groupby(internal_key).transform("min")
+    # hash the key once; everything below works on the integer group codes
+    codes, uniques = pd.factorize(internal_key, sort=False)
+    n_groups = len(uniques)
 
-    rank_in_group = row_number.groupby(internal_key).rank(method="first").astype(int)
-    rank_in_group = rank_in_group.where(in_dup_group, other=pd.NA)
+    if display_key is None:
+        display_key = pd.Series("", index=out_index)
+    else:
+        display_key = display_key.fillna("").astype(str)
 
-    codes, _ = pd.factorize(internal_key, sort=False)
-    group_id_str = pd.Series(codes, index=out_index).map(lambda x: f"G{(x+1):06d}")
-    group_id_str = group_id_str.where(in_dup_group, other="")
+    group_sizes = np.bincount(codes, minlength=n_groups)
+    counts = pd.Series(group_sizes[codes], index=out_index)
+    in_dup_group = counts.gt(1)
 
+    n_rows = len(codes)
+    row_number = np.arange(1, n_rows + 1, dtype=np.int64)
+    first_by_code = np.full(n_groups, n_rows + 1, dtype=np.int64)
+    np.minimum.at(first_by_code, codes, row_number)
+    first_seen = pd.Series(first_by_code[codes], index=out_index)
+
+    # rank = position within the group in row order: stable-sort rows by code,
+    # then subtract each group's start offset
+    order = np.argsort(codes, kind="stable")
+    group_start = np.cumsum(group_sizes) - group_sizes
+    rank = np.empty(n_rows, dtype=np.int64)
+    rank[order] = np.arange(n_rows) - group_start[codes[order]] + 1
+    rank_in_group = pd.Series(rank, index=out_index).where(in_dup_group, other=pd.NA)
+
+    # format one ID per group, then gather by code
+    group_ids = np.char.add("G", np.char.zfill(np.arange(1, n_groups + 1).astype(str), 6))
+    group_id_str = pd.Series(np.where(in_dup_group.to_numpy(), group_ids[codes], ""), index=out_index)
+
+    # rows that are not the kept copy of their group, straight from rank/size (no re-hash of the key)
+    in_dup = in_dup_group.to_numpy()
     if keep_policy == "mark_all":
-        flag = pd.Series("Unique", index=out_index)
-        flag = flag.where(~in_dup_group, other="Duplicate")
+        is_dup_row = in_dup
     elif keep_policy == "keep_first":
-        is_dup_row = internal_key.duplicated(keep="first")
-        flag = pd.Series("Unique", index=out_index)
-        flag = flag.where(~in_dup_group, other="Kept")
-        flag = flag.where(~is_dup_row, other="Duplicate")
+        is_dup_row = rank > 1
     elif keep_policy == "keep_last":
-        is_dup_row = internal_key.duplicated(keep="last")
-        flag = pd.Series("Unique", index=out_index)
-        flag = flag.where(~in_dup_group, other="Kept")
-        flag = flag.where(~is_dup_row, other="Duplicate")
+        is_dup_row = rank < group_sizes[codes]
     else:
         raise ValueError("keep_policy must be: mark_all | keep_first | keep_last")
 
+    # category codes: 0 = Unique, 1 = Kept, 2 = Duplicate (mark_all flags every row of a group)
+    flag_codes = in_dup.astype(np.int8) + is_dup_row.astype(np.int8)
+    flag = pd.Series(pd.Categorical.from_codes(flag_codes, dtype=_FLAG_DTYPE), index=out_index)
+
     display_key = display_key.where(~is_blank, other="")
 
-    out["DuplicateKey"] = display_key
-    out["DuplicateGroupID"] = group_id_str
-    out["DuplicateCount"] = counts.astype(int)
-    out["DuplicateFirstSeenRow"] = first_seen.astype(int)
-    out["DuplicateRankInGroup"] = rank_in_group
-    out["DuplicateFlag"] = flag
+    annotations = pd.DataFrame(
+        {
+            "DuplicateKey": display_key,
+            "DuplicateGroupID": group_id_str,
+            "DuplicateCount": counts.astype(int),
+            "DuplicateFirstSeenRow": first_seen.astype(int),
+            "DuplicateRankInGroup": rank_in_group,
+            "DuplicateFlag": flag,
+        },
+        index=out_index,
+    )
 
-    return out
+    # attach alongside the caller's columns rather than copying the whole frame first
+    return pd.concat([df, annotations], axis=1)
 
 
 @app.post("/dedupe")
@@ -277,86 +578,108 @@ async def dedupe(
 
     key_column: Optional[str] = Form(None),
     ignore_columns: Optional[str] = Form(None),
+
+    output_format: OutputFormat = Form("xlsx"),
 ):
+    spooled: list[str] = []
     try:
-        df = read_table(file)
-    except Exception:
-        return JSONResponse(status_code=400, content={"error": "Invalid file. Upload .xlsx or .csv"})
-
-    if df is None or df.empty:
-        return JSONResponse(status_code=400, content={"error": "File contains no rows to process."})
-
-    df.columns = [str(c) for c in df.columns]
-
-    if keep_policy not in ("mark_all", "keep_first", "keep_last"):
-        return JSONResponse(
-            status_code=400,
-            content={"error": "keep_policy must be: mark_all | keep_first | keep_last"},
+        try:
+            path, digest = await asyncio.to_thread(save_upload, file)
+            spooled.append(path)
+        except Exception:
+            return JSONResponse(status_code=400, content={"error": "Invalid file. Upload .xlsx or .csv"})
+
+        ext = output_extension(output_format, n_sheets=1)
+        output_path = result_cache_path(
+            "dedupe", ext,
+            digest, os.path.splitext(path)[1],
+            mode, keep_policy, str(ignore_case), str(ignore_whitespace),
+            key_column or "", ignore_columns or "", output_format,
         )
+        if touch_cached_result(output_path):
+            return FileResponse(output_path, media_type=OUTPUT_MEDIA_TYPES[ext], filename=f"FixMySheet_Dedupe{ext}")
 
-    if mode == "column":
-        if not key_column or not str(key_column).strip():
-            return JSONResponse(status_code=400, content={"error": "key_column is required when mode='column'."})
-
-        key_column = str(key_column).strip()
-        if key_column not in df.columns:
-            return JSONResponse(
-                status_code=400,
-                content={"error": f"Column '{key_column}' not found.", "columns": df.columns.tolist()},
-            )
-
-        col_raw = df[key_column]
-        col_norm = _normalize_text_series(col_raw, ignore_case, ignore_whitespace)
+        try:
+            df = await asyncio.to_thread(read_table, path)
+        except Exception:
+            return JSONResponse(status_code=400, content={"error": "Invalid file. Upload .xlsx or .csv"})
 
-        out = _audit_duplicate_groups(
-            df=df,
-            group_key=col_norm,
-            display_key=col_raw,
-            keep_policy=keep_policy,
-            treat_blank_as_unique=True,
-        )
-        out.insert(0, "DuplicateMode", "column")
+        if df is None or df.empty:
+            return JSONResponse(status_code=400, content={"error": "File contains no rows to process."})
 
-    elif mode == "row":
-        ignore_list: list[str] = []
-        if ignore_columns and ignore_columns.strip():
-            ignore_list = [c.strip() for c in ignore_columns.split(",") if c.strip()]
+        df.columns = [str(c) for c in df.columns]
 
-        bad_ignores = [c for c in ignore_list if c not in df.columns]
-        if bad_ignores:
+        if keep_policy not in ("mark_all", "keep_first", "keep_last"):
             return JSONResponse(
                 status_code=400,
-                content={"error": f"Ignore columns not found: {bad_ignores}", "columns": df.columns.tolist()},
+                content={"error": "keep_policy must be: mark_all | keep_first | keep_last"},
             )
 
-        subset_cols = [c for c in df.columns if c not in ignore_list]
-        if not subset_cols:
-            return JSONResponse(status_code=400, content={"error": "No columns left to compare after ignoring columns."})
-
-        row_keys = _make_row_keys(df, subset_cols, ignore_case, ignore_whitespace)
-
-        out = _audit_duplicate_groups(
-            df=df,
-            group_key=row_keys,
-            display_key=None,
-            keep_policy=keep_policy,
-            treat_blank_as_unique=False,
-        )
-        out.insert(0, "DuplicateMode", "row")
-
-    else:
-        return JSONResponse(status_code=400, content={"error": "mode must be either 'column' or 'row'."})
+        if mode == "column":
+            if not key_column or not str(key_column).strip():
+                return JSONResponse(status_code=400, content={"error": "key_column is required when mode='column'."})
+
+            key_column = str(key_column).strip()
+            if key_column not in df.columns:
+                return JSONResponse(
+                    status_code=400,
+                    content={"error": f"Column '{key_column}' not found.", "columns": df.columns.tolist()},
+                )
+
+            col_raw = df[key_column]
+            col_norm = await asyncio.to_thread(_normalize_text_series, col_raw, ignore_case, ignore_whitespace)
+
+            out = await asyncio.to_thread(
+                _audit_duplicate_groups,
+                df=df,
+                group_key=col_norm,
+                display_key=col_raw,
+                keep_policy=keep_policy,
+                treat_blank_as_unique=True,
+            )
+            out.insert(0, "DuplicateMode", pd.Categorical.from_codes(np.zeros(len(out), dtype=np.int8), ["column"]))
+
+        elif mode == "row":
+            ignore_list: list[str] = []
+            if ignore_columns and ignore_columns.strip():
+                ignore_list = [c.strip() for c in ignore_columns.split(",") if c.strip()]
+
+            bad_ignores = [c for c in ignore_list if c not in df.columns]
+            if bad_ignores:
+                return JSONResponse(
+                    status_code=400,
+                    content={"error": f"Ignore columns not found: {bad_ignores}", "columns": df.columns.tolist()},
+                )
+
+            subset_cols = [c for c in df.columns if c not in ignore_list]
+            if not subset_cols:
+                return JSONResponse(status_code=400, content={"error": "No columns left to compare after ignoring columns."})
+
+            row_keys = await asyncio.to_thread(_make_row_keys, df, subset_cols, ignore_case, ignore_whitespace)
+
+            out = await asyncio.to_thread(
+                _audit_duplicate_groups,
+                df=df,
+                group_key=row_keys,
+                display_key=None,
+                keep_policy=keep_policy,
+                treat_blank_as_unique=False,
+                hashed_key=True,
+            )
+            out.insert(0, "DuplicateMode", pd.Categorical.from_codes(np.zeros(len(out), dtype=np.int8), ["row"]))
 
-    file_id = str(uuid.uuid4())
-    output_path = os.path.join(TMP_DIR, f"dedupe_{file_id}.xlsx")
+        else:
+            return JSONResponse(status_code=400, content={"error": "mode must be either 'column' or 'row'."})
 
-    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-        out.to_excel(writer, sheet_name="All_Rows", index=False)
+        await asyncio.to_thread(write_output, output_path, {"All_Rows": out}, output_format)
 
-    background_tasks.add_task(safe_delete, output_path)
+        background_tasks.add_task(evict_cached_results)
 
-    return FileResponse(
-        output_path,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename="FixMySheet_Dedupe.xlsx",
-    )
+        return FileResponse(
+            output_path,
+            media_type=OUTPUT_MEDIA_TYPES[ext],
+            filename=f"FixMySheet_Dedupe{ext}",
+        )
+    finally:
+        for spooled_path in spooled:
+            safe_delete(spooled_path)